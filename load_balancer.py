@@ -4,51 +4,82 @@ The balancer can register up to 10 servers without duplicates and supports two l
 - round robin
 - random.
 
-The asyncio library is used for implementation, which allows working with asynchronous operations.
+The balancer API (register_server/remove_server/get_server) is synchronous, since none of it ever waits;
+asyncio is only used by the Account.transfer example, which runs as a coroutine.
 
 The code follows the SOLID principles and uses the Strategy design pattern.
 
-*** Python 3.10+
+*** Python 3.11+ (asyncio.TaskGroup)
+*** Numba (optional): if installed, the round-robin index step (modulo or power-of-two bit mask) is JIT-compiled.
 
 Optional[str] can be shortened to str | None
 """
 
 import asyncio
+import bisect
+import itertools
+import logging
+import operator
 import random
-from abc import ABC, abstractmethod
-# from concurrent.futures import ThreadPoolExecutor
-from typing import List, Optional, Set
+import threading
+from typing import List, Optional, Protocol, Sequence, Set, Tuple
 
+try:
+    from numba import njit
+except ImportError:  # Numba is optional, the pure-Python step is used instead
+    njit = None
 
-class LoadBalancingStrategy(ABC):
+logger = logging.getLogger(__name__)
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _rr_step(counter: int, size: int) -> int:
+        """
+        Maps the round-robin counter onto an index in a list of the given size.
+        For a power-of-two size the modulo is replaced with a bit mask (a single AND in compiled code).
+        """
+        if size & (size - 1) == 0:
+            return counter & (size - 1)
+        return counter % size
+else:
+    _rr_step = None
+
+# Round-robin index step, picked once at import: the compiled _rr_step, or the C-level modulo
+# (operator.mod is much cheaper to call than a pure-Python function).
+_rr_index = _rr_step if _rr_step is not None else operator.mod
+
+
+class LoadBalancingStrategy(Protocol):
     """
     (interface): Defines the select_server method that all load balancing strategies must implement.
     Allows new strategies to be easily added without changing the core code.
+    Any object with a select_server method fits (duck typing), subclassing is optional.
     """
-    @abstractmethod
-    def select_server(self, servers: List[str]) -> Optional[str]:
+    def select_server(self, servers: Sequence[str]) -> Optional[str]:
         ...
 
 
 class RoundRobinStrategy(LoadBalancingStrategy):
     """
-    Implements a round-robin strategy, selecting servers in turn (with sorting).
+    Implements a round-robin strategy, selecting servers in turn.
+    Expects the servers to be already sorted (the LoadBalancer passes its sorted snapshot).
     Complies with the Single Responsibility Principle (SRP), since it is responsible only for its own strategy.
     """
     def __init__(self):
-        self.index = 0
+        # Monotonic counter, wrapped to the current number of servers only at read time,
+        # so it stays valid when servers are added or removed.
+        # next() on itertools.count is atomic in CPython, so concurrent threads never get the same value.
+        self._counter = itertools.count()
 
-    def select_server(self, servers: List[str]) -> Optional[str]:
+    def select_server(self, servers: Sequence[str]) -> Optional[str]:
         if not servers:
             return None
-        servers = sorted(servers)  # Sorting servers
-        server = servers[self.index]
-        self.index = (self.index + 1) % len(servers)
-        return server
+        return servers[_rr_index(next(self._counter), len(servers))]
 
     def reset(self):
-        """Resets the index to 0."""
-        self.index = 0
+        """Resets the counter to 0."""
+        self._counter = itertools.count()
 
 
 class RandomStrategy(LoadBalancingStrategy):
@@ -56,72 +87,92 @@ class RandomStrategy(LoadBalancingStrategy):
     Selects a server randomly from a list.
     Complies with the Single Responsibility Principle (SRP), as it is responsible only for its own strategy.
     """
-    def select_server(self, servers: List[str]) -> Optional[str]:
-        if not servers:
-            return None
-        return random.choice(servers)
+    def __init__(self):
+        # Dedicated generator with the bound method cached to skip the module-level lookups on every call
+        self._choice = random.Random().choice
+
+    def select_server(self, servers: Sequence[str]) -> Optional[str]:
+        return self._choice(servers) if servers else None
 
 
 class LoadBalancer:
     """
     The main class that manages server registration and strategy selection.
-    It provides thread safety via asyncio.Lock.
+    register_server/remove_server are serialised with a threading.Lock: the critical sections are pure CPU
+    work with no await, so a plain lock is cheaper than asyncio.Lock. get_server takes no lock, it only reads
+    the immutable snapshot; the built-in strategies are safe to call from several threads at once.
     """
     def __init__(self, max_instances: int = 10):
-        self.servers: Set[str] = set()
+        self.servers: Set[str] = set()  # O(1) membership, independent of max_instances
+        self._sorted_servers: List[str] = []  # The same servers, kept sorted on insert so round robin never sorts
+        self._snapshot: Tuple[str, ...] = ()  # Immutable copy of _sorted_servers handed to strategies
+        self._count: int = 0  # Number of registered servers, tracked on every change
         self.max_instances: int = max_instances
         self.strategy: LoadBalancingStrategy = RoundRobinStrategy()
-        self.lock = asyncio.Lock()
-        # self.executor = ThreadPoolExecutor(max_workers=10)
+        self.lock = threading.Lock()
 
-    async def register_server(self, server: str) -> bool:
+    def register_server(self, server: str) -> bool:
         """
         Method for registering servers.
         Checks that the number of servers does not exceed the maximum value
         and that the server has not been registered previously.
         """
         try:
-            async with self.lock:
-                if len(self.servers) >= self.max_instances:
-                    print("Maximum number of servers reached.")
+            # Fast path: an already registered server is rejected without taking the lock
+            if server in self.servers:
+                logger.debug("Server %s is already registered.", server)
+                return False
+            with self.lock:
+                if self._count >= self.max_instances:
+                    logger.debug("Maximum number of servers reached.")
                     return False
-                if server in self.servers:
-                    print(f"Server {server} is already registered.")
+                if server in self.servers:  # Re-check, another thread may have registered it meanwhile
+                    logger.debug("Server %s is already registered.", server)
                     return False
+                # insort is the step that can fail (e.g. a server that does not compare with the others),
+                # so it goes first and nothing else is touched if it raises.
+                bisect.insort(self._sorted_servers, server)
                 self.servers.add(server)
-                print(f"Server {server} has been registered successfully.")
+                self._count += 1
+                self._snapshot = tuple(self._sorted_servers)
+                logger.debug("Server %s has been registered successfully.", server)
                 return True
         except Exception as e:
-            print(f"Error registering server: {e}")
+            logger.error("Error registering server: %s", e)
             return False
 
-    async def remove_server(self, server: str) -> bool:
+    def remove_server(self, server: str) -> bool:
         """Method for deleting servers."""
-        async with self.lock:
+        with self.lock:
             if server in self.servers:
                 self.servers.remove(server)
-                print(f"Server {server} has been successfully removed.")
+                self._sorted_servers.remove(server)
+                self._count -= 1
+                self._snapshot = tuple(self._sorted_servers)
+                logger.debug("Server %s has been successfully removed.", server)
                 return True
-            print(f"Server {server} not found.")
+            logger.debug("Server %s not found.", server)
             return False
 
     def set_strategy(self, strategy: LoadBalancingStrategy):
         """Sets the balancer strategy."""
-        if not isinstance(strategy, LoadBalancingStrategy):
-            raise ValueError("The strategy must be an instance of LoadBalancingStrategy")
+        if not callable(getattr(strategy, "select_server", None)):
+            raise ValueError("The strategy must implement the select_server method")
         self.strategy = strategy
 
-    async def get_server(self) -> Optional[str]:
-        """Returns the server according to the selected strategy."""
-        async with self.lock:
-            if not self.servers:
-                print("There are no registered servers.")
-                return None
-            return self.strategy.select_server(list(self.servers))
-            # return await asyncio.get_event_loop().run_in_executor(
-            #     self.executor,
-            #     self.strategy.select_server, list(self.servers)
-            # )
+    def get_server(self) -> Optional[str]:
+        """
+        Returns the server according to the selected strategy.
+        When only one server is registered it is returned directly and the strategy (including a custom one)
+        is not called at all.
+        """
+        snap = self._snapshot
+        if not snap:
+            logger.debug("There are no registered servers.")
+            return None
+        if len(snap) == 1:  # A single server needs no strategy at all
+            return snap[0]
+        return self.strategy.select_server(snap)
 
 
 class Account:
@@ -129,35 +180,50 @@ class Account:
     def __init__(self, account_id: str, balance: float):
         self.account_id = account_id
         self.balance = balance
-        self.lock = asyncio.Lock()  # Locking to ensure thread safety
+        self.lock = threading.Lock()  # Locking to ensure thread safety (no await is ever done while holding it)
 
     async def transfer(self, amount: float, target_account: 'Account'):
         """Allows you to transfer money between accounts using locking to ensure thread safety."""
 
-        # First, we block both accounts to avoid a race condition.
-        async with self.lock, target_account.lock:
-            if amount <= 0:
-                raise ValueError("The transfer amount must be positive.")
-            if self.balance < amount:
-                raise ValueError("Insufficient funds for transfer.")
+        # The amount check does not depend on the balances, so it needs no locks.
+        if amount <= 0:
+            raise ValueError("The transfer amount must be positive.")
+
+        src_id, dst_id = self.account_id, target_account.account_id
+
+        # We block both accounts only for the balance read-modify-write to avoid a race condition.
+        # Locks are always taken in the same (id-based) order, so opposite transfers cannot deadlock,
+        # and a transfer to the same account takes its lock only once.
+        first, second = sorted((self, target_account), key=id)
+        if first is second:
+            with first.lock:
+                self._move_funds(amount, target_account)
+        else:
+            with first.lock, second.lock:
+                self._move_funds(amount, target_account)
+        logger.debug("Transfer by %s %s to %s.", amount, src_id, dst_id)
+
+    def _move_funds(self, amount: float, target_account: 'Account'):
+        """Balance read-modify-write of a transfer, the caller must hold the locks of both accounts."""
+        if self.balance < amount:
+            raise ValueError("Insufficient funds for transfer.")
 
-            self.balance -= amount
-            target_account.balance += amount
-            print(f"Transfer by {amount} {self.account_id} to {target_account.account_id}.")
+        self.balance -= amount
+        target_account.balance += amount
 
 
 async def main():
     """Example of use."""
     load_balancer = LoadBalancer()
 
-    await load_balancer.register_server("192.168.1.1")
-    await load_balancer.register_server("192.168.1.2")
-    await load_balancer.register_server("192.168.1.3")
+    load_balancer.register_server("192.168.1.1")
+    load_balancer.register_server("192.168.1.2")
+    load_balancer.register_server("192.168.1.3")
 
     load_balancer.set_strategy(RoundRobinStrategy())
 
     for _ in range(5):
-        server = await load_balancer.get_server()
+        server = load_balancer.get_server()
         print(f"Selected server: {server}")
 
     # Creating accounts
@@ -172,7 +238,9 @@ async def main():
             print(e)
 
     # Launching multiple transfers
-    await asyncio.gather(perform_transfer(), perform_transfer())
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(perform_transfer())
+        tg.create_task(perform_transfer())
 
     # Check balance
     print(f"{account1.account_id} balance: {account1.balance}")
@@ -180,4 +248,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     asyncio.run(main())
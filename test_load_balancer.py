@@ -1,60 +1,71 @@
 """
-python3.9 -m unittest test_load_balancer.py
+python3.11 -m unittest test_load_balancer.py
 """
 
 import unittest
 import asyncio
-# from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
 
+import load_balancer
 from load_balancer import Account, LoadBalancer, RandomStrategy, RoundRobinStrategy
 
 
 class TestLoadBalancer(unittest.TestCase):
-    def setUp(self):
-        self.loop = asyncio.get_event_loop()
-        # self.executor = ThreadPoolExecutor(max_workers=10)
-
     def test_register_server(self):
         """Checks that the server registers successfully."""
         load_balancer = LoadBalancer()
-        self.loop.run_until_complete(load_balancer.register_server("192.168.1.1"))
+        load_balancer.register_server("192.168.1.1")
         self.assertIn("192.168.1.1", load_balancer.servers)
 
     def test_register_duplicate_server(self):
         """Checks that re-registering the server returns False."""
         load_balancer = LoadBalancer()
-        self.loop.run_until_complete(load_balancer.register_server("192.168.1.1"))
-        result = self.loop.run_until_complete(load_balancer.register_server("192.168.1.1"))
+        load_balancer.register_server("192.168.1.1")
+        result = load_balancer.register_server("192.168.1.1")
         self.assertFalse(result)
 
     def test_register_max_servers(self):
         """Checks that False is returned when attempting to register more than 10 servers."""
         load_balancer = LoadBalancer()
         for i in range(10):
-            self.loop.run_until_complete(load_balancer.register_server(f"192.168.1.{i + 1}"))
-        result = self.loop.run_until_complete(load_balancer.register_server("192.168.1.11"))
+            load_balancer.register_server(f"192.168.1.{i + 1}")
+        result = load_balancer.register_server("192.168.1.11")
+        self.assertFalse(result)
+
+    def test_register_failure_keeps_state(self):
+        """Checks that a failed registration leaves the server structures consistent."""
+        load_balancer = LoadBalancer()
+        load_balancer.register_server("192.168.1.1")
+        # An int cannot be ordered against the registered strings, so insort fails
+        result = load_balancer.register_server(1)
         self.assertFalse(result)
+        self.assertEqual(load_balancer.servers, {"192.168.1.1"})
+        self.assertEqual(load_balancer._sorted_servers, ["192.168.1.1"])
+        self.assertEqual(load_balancer._count, 1)
+        self.assertEqual(load_balancer._snapshot, ("192.168.1.1",))
+        self.assertFalse(load_balancer.remove_server(1))
 
     def test_remove_server(self):
         """Checks that the server is being removed successfully."""
         load_balancer = LoadBalancer()
-        self.loop.run_until_complete(load_balancer.register_server("192.168.1.1"))
-        result = self.loop.run_until_complete(load_balancer.remove_server("192.168.1.1"))
+        load_balancer.register_server("192.168.1.1")
+        result = load_balancer.remove_server("192.168.1.1")
         self.assertTrue(result)
         self.assertNotIn("192.168.1.1", load_balancer.servers)
 
     def test_remove_non_existent_server(self):
         """Checks that deleting a non-existent server returns False."""
         load_balancer = LoadBalancer()
-        result = self.loop.run_until_complete(load_balancer.remove_server("192.168.1.1"))
+        result = load_balancer.remove_server("192.168.1.1")
         self.assertFalse(result)
 
     def test_round_robin_strategy(self):
         """Checks that servers are selected in a round-robin manner."""
         load_balancer = LoadBalancer()
         # Registering servers
-        self.loop.run_until_complete(load_balancer.register_server("192.168.1.1"))
-        self.loop.run_until_complete(load_balancer.register_server("192.168.1.2"))
+        load_balancer.register_server("192.168.1.1")
+        load_balancer.register_server("192.168.1.2")
 
         # We set up a new circular strategy and reset the index
         round_robin_strategy = RoundRobinStrategy()  # Create a new instance every time
@@ -64,30 +75,93 @@ class TestLoadBalancer(unittest.TestCase):
         round_robin_strategy.reset()
 
         # We check the selection of servers in a circle
-        server1 = self.loop.run_until_complete(load_balancer.get_server())
-        server2 = self.loop.run_until_complete(load_balancer.get_server())
+        server1 = load_balancer.get_server()
+        server2 = load_balancer.get_server()
 
         self.assertEqual(server1, "192.168.1.1")
         self.assertEqual(server2, "192.168.1.2")
 
+    def test_round_robin_after_remove(self):
+        """Checks that round robin keeps working when the number of servers shrinks."""
+        load_balancer = LoadBalancer()
+        for i in range(3):
+            load_balancer.register_server(f"192.168.1.{i + 1}")
+        load_balancer.set_strategy(RoundRobinStrategy())
+
+        # Move the strategy to the last server, then remove one
+        for _ in range(2):
+            load_balancer.get_server()
+        load_balancer.remove_server("192.168.1.3")
+
+        servers = [load_balancer.get_server() for _ in range(4)]
+        self.assertEqual(set(servers), {"192.168.1.1", "192.168.1.2"})
+
+    def test_round_robin_power_of_two(self):
+        """Checks the round-robin order for a power-of-two number of servers and after it changes."""
+        load_balancer = LoadBalancer()
+        for i in range(4):
+            load_balancer.register_server(f"192.168.1.{i + 1}")
+        load_balancer.set_strategy(RoundRobinStrategy())
+
+        servers = [load_balancer.get_server() for _ in range(8)]
+        self.assertEqual(servers, [f"192.168.1.{i % 4 + 1}" for i in range(8)])
+
+        load_balancer.remove_server("192.168.1.4")
+        servers = [load_balancer.get_server() for _ in range(3)]
+        self.assertEqual(sorted(servers), ["192.168.1.1", "192.168.1.2", "192.168.1.3"])
+
+    @unittest.skipIf(load_balancer._rr_step is None, "Numba is not installed")
+    def test_rr_step(self):
+        """Checks that the JIT-compiled round-robin step (bit mask for n = 1, 2, 4, 8) matches the plain modulo."""
+        for n in range(1, 12):
+            for i in range(100):
+                self.assertEqual(load_balancer._rr_step(i, n), i % n)
+
     def test_random_strategy(self):
         """Checks that servers are selected randomly."""
         load_balancer = LoadBalancer()
-        self.loop.run_until_complete(load_balancer.register_server("192.168.1.1"))
-        self.loop.run_until_complete(load_balancer.register_server("192.168.1.2"))
+        load_balancer.register_server("192.168.1.1")
+        load_balancer.register_server("192.168.1.2")
         load_balancer.set_strategy(RandomStrategy())
 
         # We run several elections to check that the servers are selected randomly
-        selected_servers = [self.loop.run_until_complete(load_balancer.get_server()) for _ in range(10)]
+        selected_servers = [load_balancer.get_server() for _ in range(10)]
         self.assertIn("192.168.1.1", selected_servers)
         self.assertIn("192.168.1.2", selected_servers)
 
+    def test_single_server(self):
+        """Checks that with a single server it is returned without calling the strategy."""
+        class RecordingStrategy:
+            def __init__(self):
+                self.calls = 0
+
+            def select_server(self, servers):
+                self.calls += 1
+                return servers[-1]
 
-class TestAccount(unittest.TestCase):
+        strategy = RecordingStrategy()
+        load_balancer = LoadBalancer()
+        load_balancer.set_strategy(strategy)
+        load_balancer.register_server("192.168.1.1")
+        self.assertEqual([load_balancer.get_server() for _ in range(3)], ["192.168.1.1"] * 3)
+        self.assertEqual(strategy.calls, 0)
+
+        # With more servers the strategy is used again
+        load_balancer.register_server("192.168.1.2")
+        self.assertEqual(load_balancer.get_server(), "192.168.1.2")
+        self.assertEqual(strategy.calls, 1)
+
+    def test_set_invalid_strategy(self):
+        """Checks that a strategy without select_server is rejected."""
+        load_balancer = LoadBalancer()
+        with self.assertRaises(ValueError):
+            load_balancer.set_strategy(object())
+
+
+class TestAccount(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
         self.account1 = Account("Account1", 100.0)
         self.account2 = Account("Account2", 50.0)
-        self.loop = asyncio.get_event_loop()
 
     async def transfer_wrapper(self, amount, target_account):
         """
@@ -97,24 +171,57 @@ class TestAccount(unittest.TestCase):
         """
         await self.account1.transfer(amount, target_account)
 
-    def test_successful_transfer(self):
+    async def test_successful_transfer(self):
         """Checks successful transfer of funds between accounts."""
-        self.loop.run_until_complete(self.transfer_wrapper(30.0, self.account2))
+        await self.transfer_wrapper(30.0, self.account2)
         self.assertEqual(self.account1.balance, 70.0)
         self.assertEqual(self.account2.balance, 80.0)
 
-    def test_transfer_insufficient_funds(self):
+    async def test_transfer_insufficient_funds(self):
         """Ensures that an exception is thrown if there are insufficient funds."""
         with self.assertRaises(ValueError) as context:
-            self.loop.run_until_complete(self.transfer_wrapper(200.0, self.account2))
+            await self.transfer_wrapper(200.0, self.account2)
         self.assertEqual(str(context.exception), "Insufficient funds for transfer.")
 
-    def test_transfer_negative_amount(self):
+    async def test_transfer_negative_amount(self):
         """Checks that attempting to transfer a negative amount throws an exception."""
         with self.assertRaises(ValueError) as context:
-            self.loop.run_until_complete(self.transfer_wrapper(-10.0, self.account2))
+            await self.transfer_wrapper(-10.0, self.account2)
         self.assertEqual(str(context.exception), "The transfer amount must be positive.")
 
+    def test_opposite_transfers(self):
+        """Checks that transfers in opposite directions from two threads do not deadlock."""
+        account1 = Account("Account1", 10_000.0)
+        account2 = Account("Account2", 10_000.0)
+
+        async def transfers(source, target):
+            for _ in range(10_000):
+                await source.transfer(1.0, target)
+
+        # Frequent thread switches make it likely that each thread holds one lock while waiting for the other
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            threads = [
+                threading.Thread(target=asyncio.run, args=(transfers(account1, account2),), daemon=True),
+                threading.Thread(target=asyncio.run, args=(transfers(account2, account1),), daemon=True),
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=10)
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads), "Opposite transfers deadlocked")
+        self.assertEqual(account1.balance, 10_000.0)
+        self.assertEqual(account2.balance, 10_000.0)
+
+    async def test_transfer_to_same_account(self):
+        """Checks that a transfer to the same account does not deadlock and keeps the balance."""
+        await asyncio.wait_for(self.account1.transfer(30.0, self.account1), timeout=1)
+        self.assertEqual(self.account1.balance, 100.0)
+
 
 if __name__ == "__main__":
     unittest.main()